@@ -0,0 +1,85 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Optional
+
+import diskcache
+import orjson
+
+
+CACHE_DIR = "outputs/.rag_cache"
+CACHE_TTL = 24 * 60 * 60  # 24 hours
+# Bump whenever the red flag patterns or the RAG prompts change what an analysis
+# contains, so entries written by an older build are not served after a deploy
+CACHE_VERSION = 1
+
+
+def content_key(text: str) -> str:
+    """Return a short, collision-safe digest of the document text."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class AnalysisCache:
+    """Content-addressed cache for document analysis results.
+
+    Results are stored as serialized JSON keyed on the cache version, text digest
+    and document type: an in-memory LRU sits in front of a disk cache that is
+    shared by worker processes and survives across sessions.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, maxsize: int = 256, ttl: int = CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()  # the agent, and so this cache, is shared by session threads
+        self._disk = diskcache.Cache(directory)
+
+    def get(self, namespace: str, text: str, document_type: str) -> Optional[Dict[str, Any]]:
+        """Return the cached analysis for this text, or None on a miss."""
+        key = self._key(namespace, text, document_type)
+
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+        if payload is not None:
+            return orjson.loads(payload)
+
+        payload = self._disk.get(key)
+        if payload is None:
+            return None
+
+        self._remember(key, payload)
+        return orjson.loads(payload)
+
+    def set(self, namespace: str, text: str, document_type: str, analysis: Dict[str, Any]):
+        """Store an analysis for this text."""
+        key = self._key(namespace, text, document_type)
+        payload = orjson.dumps(analysis)
+        self._disk.set(key, payload, expire=self.ttl)
+        self._remember(key, payload)
+
+    def get_or_compute(self, namespace: str, text: str, document_type: str,
+                       compute: Callable[[str, str], Dict[str, Any]]) -> Dict[str, Any]:
+        """Return the cached analysis for this text, computing and storing it on a miss."""
+        analysis = self.get(namespace, text, document_type)
+        if analysis is None:
+            analysis = compute(text, document_type)
+            self.set(namespace, text, document_type, analysis)
+        return analysis
+
+    def _key(self, namespace: str, text: str, document_type: str) -> str:
+        return f"{CACHE_VERSION}:{namespace}:{content_key(text)}:{document_type}"
+
+    def _remember(self, key: str, payload: bytes):
+        with self._lock:
+            self._memory[key] = payload
+            self._memory.move_to_end(key)
+            if len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached analyses, in memory and on disk."""
+        with self._lock:
+            self._memory.clear()
+        self._disk.clear()
@@ -1,16 +1,31 @@
 import streamlit as st
+import io
 import os
-import json
-import tempfile
+import copy
+import shutil
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from typing import List, Dict, Any
-import pandas as pd
-from datetime import datetime
+import orjson
 
 # Import our custom modules
 from doc_parser import DocumentParser
-from rag_engine import RAGEngine
 from redfalg_checker import RedFlagChecker
 from comment_inserter import CommentInserter
+from analysis_cache import AnalysisCache
+from document_pipeline import (
+    process_document,
+    process_document_in_worker,
+    parsed_output_path,
+    reviewed_output_path
+)
+
+
+_SEVERITY_COLORS = {
+    "High": "🔴",
+    "Medium": "🟡",
+    "Low": "🟢"
+}
 
 
 class CorporateAgent:
@@ -18,12 +33,21 @@ class CorporateAgent:
     
     def __init__(self):
         self.parser = DocumentParser()
-        self.rag_engine = RAGEngine()
+        self.rag_engine = _get_rag_engine()
         self.red_flag_checker = RedFlagChecker()
         self.comment_inserter = CommentInserter()
         
         # Create outputs directory if it doesn't exist
         os.makedirs("outputs", exist_ok=True)
+        
+        # Cache analyses by document content so re-uploads skip the checks and LLM call
+        self.analysis_cache = AnalysisCache()
+    
+    def clear_cache(self):
+        """Clear cached red flag and RAG analyses."""
+        self.analysis_cache.clear()
+        self.rag_engine.clear_cache()
+        self.red_flag_checker.clear_cache()
     
     def process_documents(self, uploaded_files: List) -> Dict[str, Any]:
         """Process uploaded documents and return comprehensive analysis."""
@@ -35,62 +59,93 @@ class CorporateAgent:
             "reviewed_files": []
         }
         
-        # Parse each uploaded document
-        for uploaded_file in uploaded_files:
+        # Identical uploads are processed once and their results reused
+        digests = [
+            hashlib.blake2b(uploaded_file.getvalue(), digest_size=16).hexdigest()
+            for uploaded_file in uploaded_files
+        ]
+        unique_files = {}
+        for digest, uploaded_file in zip(digests, uploaded_files):
+            unique_files.setdefault(digest, uploaded_file)
+        
+        # Parse, red-flag check and annotate each document; the per-document
+        # pipelines are independent, so fan them out when there are several
+        processed = {}
+        if len(unique_files) <= 1:
+            for digest, uploaded_file in unique_files.items():
+                try:
+                    processed[digest] = process_document(
+                        uploaded_file.getvalue(),
+                        uploaded_file.name,
+                        self.parser,
+                        self.red_flag_checker,
+                        self.comment_inserter,
+                        self.analysis_cache
+                    )
+                except Exception as e:
+                    st.error(f"Error processing {uploaded_file.name}: {str(e)}")
+        else:
+            max_workers = min(len(unique_files), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(process_document_in_worker, uploaded_file.getvalue(), uploaded_file.name): digest
+                    for digest, uploaded_file in unique_files.items()
+                }
+                for future in as_completed(futures):
+                    digest = futures[future]
+                    try:
+                        processed[digest] = future.result()
+                    except Exception as e:
+                        st.error(f"Error processing {unique_files[digest].name}: {str(e)}")
+        
+        # Get RAG-based compliance analysis, cached on document content; all
+        # uncached documents go to the LLM in one batched request
+        rag_analyses = {}
+        pending = []
+        for digest, (document_result, text, reviewed_error) in processed.items():
+            if reviewed_error:
+                st.error(f"Error creating reviewed document: {reviewed_error}")
+            
+            cached = self.analysis_cache.get("rag", text, document_result["document_type"])
+            if cached is not None:
+                rag_analyses[digest] = cached
+            else:
+                pending.append((digest, text, document_result["document_type"]))
+        
+        if pending:
             try:
-                # Save uploaded file temporarily
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as tmp_file:
-                    tmp_file.write(uploaded_file.getvalue())
-                    tmp_path = tmp_file.name
-                
-                # Parse document
-                doc_info = self.parser.parse_document(tmp_path)
-                
-                # --- Save parsed output as JSON ---
-                json_filename = f"{os.path.splitext(uploaded_file.name)[0]}_output.json"
-                json_path = os.path.join("outputs", json_filename)
-                with open(json_path, "w", encoding="utf-8") as f:
-                    json.dump(doc_info, f, indent=2, ensure_ascii=False)
-                # ----------------------------------
-                
-                # Analyze for red flags
-                red_flag_analysis = self.red_flag_checker.analyze_document(
-                    doc_info["text"], 
-                    doc_info["document_type"]
-                )
-                
-                # Get RAG-based compliance analysis
-                rag_analysis = self.rag_engine.analyze_document_compliance(
-                    doc_info["text"], 
-                    doc_info["document_type"]
+                batch_analyses = self.rag_engine.analyze_batch(
+                    [(text, document_type) for _, text, document_type in pending]
                 )
-                
-                # Create reviewed document with comments
-                reviewed_path = self._create_reviewed_document(
-                    tmp_path, 
-                    red_flag_analysis["issues"], 
-                    doc_info["document_type"]
-                )
-                
-                # Store results
-                document_result = {
-                    "file_name": uploaded_file.name,
-                    "document_type": doc_info["document_type"],
-                    "confidence": doc_info["confidence"],
-                    "word_count": doc_info["word_count"],
-                    "red_flag_analysis": red_flag_analysis,
-                    "rag_analysis": rag_analysis,
-                    "reviewed_file_path": reviewed_path,
-                    "json_output_path": json_path  # Optionally add this for reference
-                }
-                
-                results["documents_analyzed"].append(document_result)
-                
-                # Clean up temp file
-                os.unlink(tmp_path)
-                
+                for (digest, text, document_type), analysis in zip(pending, batch_analyses):
+                    self.analysis_cache.set("rag", text, document_type, analysis)
+                    rag_analyses[digest] = analysis
             except Exception as e:
-                st.error(f"Error processing {uploaded_file.name}: {str(e)}")
+                for digest, _, _ in pending:
+                    st.error(f"Error processing {processed[digest][0]['file_name']}: {str(e)}")
+        
+        analyzed = {}
+        for digest, (document_result, _, _) in processed.items():
+            if digest in rag_analyses:
+                document_result["rag_analysis"] = rag_analyses[digest]
+                analyzed[digest] = document_result
+        
+        # Collect results in upload order, copying them for duplicate uploads
+        reused = set()
+        for digest, uploaded_file in zip(digests, uploaded_files):
+            if digest not in analyzed:
+                continue
+            
+            document_result = analyzed[digest]
+            if digest in reused:
+                try:
+                    document_result = self._copy_document_result(document_result, uploaded_file.name)
+                except Exception as e:
+                    st.error(f"Error processing {uploaded_file.name}: {str(e)}")
+                    continue
+            reused.add(digest)
+            
+            results["documents_analyzed"].append(document_result)
         
         # Detect process and check missing documents
         if results["documents_analyzed"]:
@@ -110,61 +165,124 @@ class CorporateAgent:
         
         return results
     
-    def _create_reviewed_document(self, original_path: str, issues: List[Dict], 
-                                document_type: str) -> str:
-        """Create a reviewed version of the document."""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_filename = f"reviewed_{document_type.replace(' ', '_')}_{timestamp}.docx"
-        output_path = os.path.join("outputs", output_filename)
+    def _copy_document_result(self, document_result: Dict[str, Any], file_name: str) -> Dict[str, Any]:
+        """Reuse the result of an identical upload under another file name."""
+        duplicate = copy.deepcopy(document_result)
+        duplicate["file_name"] = file_name
         
-        try:
-            # Create reviewed document with comments
-            reviewed_path = self.comment_inserter.create_reviewed_document(
-                original_path, issues, output_path
-            )
-            return reviewed_path
-        except Exception as e:
-            st.error(f"Error creating reviewed document: {str(e)}")
-            return None
+        if document_result["reviewed_file_path"]:
+            reviewed_path = reviewed_output_path(document_result["document_type"])
+            shutil.copy2(document_result["reviewed_file_path"], reviewed_path)
+            duplicate["reviewed_file_path"] = reviewed_path
+        
+        json_path = parsed_output_path(file_name)
+        if json_path != document_result["json_output_path"]:
+            shutil.copy2(document_result["json_output_path"], json_path)
+        duplicate["json_output_path"] = json_path
+        
+        return duplicate
     
     def generate_structured_report(self, results: Dict[str, Any]) -> Dict[str, Any]:
         """Generate structured JSON report as specified in requirements."""
-        report = {
-            "process": results.get("process_detected", "Unknown"),
-            "documents_uploaded": len(results.get("documents_analyzed", [])),
-            "required_documents": 0,
-            "missing_document": "",
-            "issues_found": []
+        # Key the cached report on the fields it reads only; reviewed file paths and
+        # RAG analyses change or weigh in on every rerun without affecting it
+        report_input = {
+            "process_detected": results.get("process_detected", ""),
+            "missing_documents": results.get("missing_documents", []),
+            "documents_analyzed": [
+                {
+                    "file_name": doc_result["file_name"],
+                    "document_type": doc_result["document_type"],
+                    "red_flag_analysis": {"issues": doc_result["red_flag_analysis"].get("issues", [])}
+                }
+                for doc_result in results.get("documents_analyzed", [])
+            ]
         }
+        return _build_structured_report(orjson.dumps(report_input, option=orjson.OPT_SORT_KEYS))
+
+
+@st.cache_resource
+def _get_rag_engine():
+    """Load the RAG engine once per process; imported here to keep app startup fast."""
+    from rag_engine import RAGEngine
+    return RAGEngine()
+
+
+@st.cache_resource
+def get_agent() -> CorporateAgent:
+    """Return the Corporate Agent shared across reruns and sessions."""
+    return CorporateAgent()
+
+
+@st.cache_data(max_entries=32)
+def _build_structured_report(results_json: bytes) -> Dict[str, Any]:
+    """Build the structured report; cached on the serialized report inputs so reruns reuse it."""
+    results = orjson.loads(results_json)
+    parser = DocumentParser()
+    
+    report = {
+        "process": results.get("process_detected", "Unknown"),
+        "documents_uploaded": len(results.get("documents_analyzed", [])),
+        "required_documents": 0,
+        "missing_document": "",
+        "issues_found": []
+    }
+    
+    # Calculate required documents
+    if results.get("process_detected"):
+        required_docs = parser.get_required_documents_for_process(
+            results["process_detected"]
+        )
+        report["required_documents"] = len(required_docs)
         
-        # Calculate required documents
-        if results.get("process_detected"):
-            required_docs = self.parser.get_required_documents_for_process(
-                results["process_detected"]
-            )
-            report["required_documents"] = len(required_docs)
-            
-            # Set missing document
-            missing_docs = results.get("missing_documents", [])
-            if missing_docs:
-                report["missing_document"] = missing_docs[0]
-        
-        # Collect all issues
-        for doc_result in results.get("documents_analyzed", []):
-            doc_name = doc_result["file_name"]
-            doc_type = doc_result["document_type"]
-            
-            # Add red flag issues
-            for issue in doc_result["red_flag_analysis"].get("issues", []):
-                report["issues_found"].append({
-                    "document": doc_type,
-                    "section": issue.get("location", "General"),
-                    "issue": issue.get("description", ""),
-                    "severity": issue.get("severity", "Medium"),
-                    "suggestion": issue.get("suggestion", "")
-                })
+        # Set missing document
+        missing_docs = results.get("missing_documents", [])
+        if missing_docs:
+            report["missing_document"] = missing_docs[0]
+    
+    # Collect all issues
+    for doc_result in results.get("documents_analyzed", []):
+        doc_name = doc_result["file_name"]
+        doc_type = doc_result["document_type"]
         
-        return report
+        # Add red flag issues
+        for issue in doc_result["red_flag_analysis"].get("issues", []):
+            report["issues_found"].append({
+                "document": doc_type,
+                "section": issue.get("location", "General"),
+                "issue": issue.get("description", ""),
+                "severity": issue.get("severity", "Medium"),
+                "suggestion": issue.get("suggestion", "")
+            })
+    
+    return report
+
+
+@st.cache_data(max_entries=32)
+def _report_to_json(structured_report: Dict[str, Any]) -> str:
+    """Serialize the structured report for download."""
+    return orjson.dumps(structured_report, option=orjson.OPT_INDENT_2).decode()
+
+
+@st.cache_data(max_entries=32)
+def _issues_to_csv(issues: List[Dict[str, Any]]) -> bytes:
+    """Serialize the report issues as CSV for download using Arrow's native writer."""
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    
+    buffer = io.BytesIO()
+    pa_csv.write_csv(pa.Table.from_pylist(issues), buffer)
+    return buffer.getvalue()
+
+
+def _read_reviewed_files(paths: List[str]) -> Dict[str, bytes]:
+    """Read reviewed documents concurrently for the download buttons."""
+    def read(path: str) -> bytes:
+        with open(path, 'rb') as f:
+            return f.read()
+    
+    with ThreadPoolExecutor() as executor:
+        return dict(zip(paths, executor.map(read, paths)))
 
 
 def main():
@@ -199,7 +317,12 @@ def main():
     uploaded_files = None
     try:
         # Initialize Corporate Agent
-        agent = CorporateAgent()
+        agent = get_agent()
+        
+        with st.sidebar:
+            if st.button("🗑️ Clear Analysis Cache"):
+                agent.clear_cache()
+                st.success("Analysis cache cleared")
         
         # File upload section
         st.header("📄 Document Upload")
@@ -252,6 +375,13 @@ def main():
                 # Document analysis results
                 st.subheader("📋 Document Analysis")
                 
+                # Read all reviewed documents up front for the download buttons
+                reviewed_files = _read_reviewed_files([
+                    doc_result['reviewed_file_path']
+                    for doc_result in results["documents_analyzed"]
+                    if doc_result['reviewed_file_path']
+                ])
+                
                 for doc_result in results["documents_analyzed"]:
                     with st.expander(f"📄 {doc_result['file_name']} ({doc_result['document_type']})"):
                         col1, col2, col3 = st.columns(3)
@@ -267,23 +397,18 @@ def main():
                         if doc_result['red_flag_analysis']['issues']:
                             st.write("**Issues Found:**")
                             for issue in doc_result['red_flag_analysis']['issues'][:5]:  # Show first 5
-                                severity_color = {
-                                    "High": "🔴",
-                                    "Medium": "🟡", 
-                                    "Low": "🟢"
-                                }.get(issue['severity'], "⚪")
+                                severity_color = _SEVERITY_COLORS.get(issue['severity'], "⚪")
                                 
                                 st.write(f"{severity_color} **{issue['severity']}**: {issue['description']}")
                         
                         # Download reviewed document
                         if doc_result['reviewed_file_path']:
-                            with open(doc_result['reviewed_file_path'], 'rb') as f:
-                                st.download_button(
-                                    label=f"📥 Download Reviewed {doc_result['document_type']}",
-                                    data=f.read(),
-                                    file_name=f"reviewed_{doc_result['file_name']}",
-                                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                                )
+                            st.download_button(
+                                label=f"📥 Download Reviewed {doc_result['document_type']}",
+                                data=reviewed_files[doc_result['reviewed_file_path']],
+                                file_name=f"reviewed_{doc_result['file_name']}",
+                                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+                            )
                 
                 # Generate structured report
                 st.subheader("📊 Structured Report")
@@ -297,7 +422,7 @@ def main():
                 
                 with col2:
                     # Download JSON report
-                    json_str = json.dumps(structured_report, indent=2)
+                    json_str = _report_to_json(structured_report)
                     st.download_button(
                         label="📥 Download JSON Report",
                         data=json_str,
@@ -307,8 +432,7 @@ def main():
                     
                     # Download CSV report
                     if structured_report["issues_found"]:
-                        df = pd.DataFrame(structured_report["issues_found"])
-                        csv_str = df.to_csv(index=False)
+                        csv_str = _issues_to_csv(structured_report["issues_found"])
                         st.download_button(
                             label="📥 Download CSV Report",
                             data=csv_str,
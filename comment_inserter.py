@@ -1,5 +1,8 @@
 import os
-from typing import List, Dict, Any
+import re
+import copy
+from collections import Counter
+from typing import IO, List, Dict, Any, Union
 from docx import Document
 from docx.shared import Inches
 from docx.oxml.shared import OxmlElement, qn
@@ -7,9 +10,81 @@ from docx.oxml.ns import nsdecls
 from docx.oxml import parse_xml
 
 
+_SEVERITY_ICONS = {
+    "High": "🚨",
+    "Medium": "⚠️",
+    "Low": "ℹ️"
+}
+
+
+def _format_issue_comment(header: str, description: str, adgm_reference: str, suggestion: str) -> str:
+    """Format the comment text for a single issue."""
+    return f"{header}: {description}\n\nADGM Reference: {adgm_reference}\n\nSuggestion: {suggestion}"
+
+
 class CommentInserter:
     """Inserts contextual comments into .docx documents based on analysis results."""
     
+    # Keywords that mark a paragraph for highlighting
+    JURISDICTION_KEYWORDS = ("uae federal", "federal courts", "uae law")
+    SIGNATURE_KEYWORDS = ("signature", "signed", "executed")
+    SIGNATURE_BLOCK_KEYWORDS = ("signature block", "signed by", "executed by")
+    
+    # One pass per paragraph; signature blocks come first so "signed by" is not
+    # consumed as a bare "signed"
+    _HIGHLIGHT_RE = re.compile(
+        "(?P<signature_block>" + "|".join(map(re.escape, SIGNATURE_BLOCK_KEYWORDS)) + ")"
+        "|(?P<jurisdiction>" + "|".join(map(re.escape, JURISDICTION_KEYWORDS)) + ")"
+        "|(?P<signature>" + "|".join(map(re.escape, SIGNATURE_KEYWORDS)) + ")"
+    )
+    
+    # Narrower scans for documents with only one of the highlighted issue types
+    _JURISDICTION_RE = re.compile(
+        "(?P<jurisdiction>" + "|".join(map(re.escape, JURISDICTION_KEYWORDS)) + ")"
+    )
+    _SIGNATURE_RE = re.compile(
+        "(?P<signature_block>" + "|".join(map(re.escape, SIGNATURE_BLOCK_KEYWORDS)) + ")"
+        "|(?P<signature>" + "|".join(map(re.escape, SIGNATURE_KEYWORDS)) + ")"
+    )
+    
+    # Comment header and highlight colour for each issue type
+    COMMENT_TEMPLATES = {
+        "jurisdiction_issue": {
+            "header": "🚨 JURISDICTION ISSUE",
+            "severity_color": "FF0000"  # Red
+        },
+        "missing_clause": {
+            "header": "⚠️ MISSING CLAUSE",
+            "severity_color": "FF6600"  # Orange
+        },
+        "ambiguous_language": {
+            "header": "⚠️ AMBIGUOUS LANGUAGE",
+            "severity_color": "FF9900"  # Yellow
+        },
+        "missing_signatures": {
+            "header": "🚨 MISSING SIGNATURES",
+            "severity_color": "FF0000"  # Red
+        },
+        "incomplete_info": {
+            "header": "⚠️ INCOMPLETE INFORMATION",
+            "severity_color": "FF9900"  # Yellow
+        },
+        "non_compliant_structure": {
+            "header": "🚨 NON-COMPLIANT STRUCTURE",
+            "severity_color": "FF0000"  # Red
+        },
+        "formatting_issue": {
+            "header": "ℹ️ FORMATTING ISSUE",
+            "severity_color": "0066CC"  # Blue
+        }
+    }
+    
+    # Prototype comment markers, cloned per comment instead of built by the element factory
+    _PROTO_RANGE_START = OxmlElement('w:commentRangeStart')
+    _PROTO_RANGE_END = OxmlElement('w:commentRangeEnd')
+    _PROTO_REFERENCE = OxmlElement('w:commentReference')
+    _ID_ATTR = qn('w:id')
+    
     def __init__(self):
         self.comment_counter = 0
     
@@ -17,15 +92,17 @@ class CommentInserter:
         """Add a comment to a specific paragraph."""
         self.comment_counter += 1
         
-        # Create comment element
-        comment_element = OxmlElement('w:commentRangeStart')
-        comment_element.set(qn('w:id'), str(self.comment_counter))
+        comment_id = str(self.comment_counter)
         
-        comment_end_element = OxmlElement('w:commentRangeEnd')
-        comment_end_element.set(qn('w:id'), str(self.comment_counter))
+        # Create comment elements by cloning the prototypes
+        comment_element = copy.deepcopy(self._PROTO_RANGE_START)
+        comment_element.set(self._ID_ATTR, comment_id)
         
-        comment_reference = OxmlElement('w:commentReference')
-        comment_reference.set(qn('w:id'), str(self.comment_counter))
+        comment_end_element = copy.deepcopy(self._PROTO_RANGE_END)
+        comment_end_element.set(self._ID_ATTR, comment_id)
+        
+        comment_reference = copy.deepcopy(self._PROTO_REFERENCE)
+        comment_reference.set(self._ID_ATTR, comment_id)
         
         # Insert comment elements
         paragraph._element.insert(0, comment_element)
@@ -33,7 +110,7 @@ class CommentInserter:
         paragraph._element.append(comment_reference)
         
         # Add comment to document
-        self._add_comment_to_document(comment_text, author, str(self.comment_counter))
+        self._add_comment_to_document(comment_text, author, comment_id)
     
     def _add_comment_to_document(self, comment_text: str, author: str, comment_id: str):
         """Add comment to document's comment collection."""
@@ -47,56 +124,27 @@ class CommentInserter:
         if not issues:
             return doc
         
-        # Create a mapping of issue types to comment templates
-        comment_templates = {
-            "jurisdiction_issue": {
-                "template": "🚨 JURISDICTION ISSUE: {description}\n\nADGM Reference: {adgm_reference}\n\nSuggestion: {suggestion}",
-                "severity_color": "FF0000"  # Red
-            },
-            "missing_clause": {
-                "template": "⚠️ MISSING CLAUSE: {description}\n\nADGM Reference: {adgm_reference}\n\nSuggestion: {suggestion}",
-                "severity_color": "FF6600"  # Orange
-            },
-            "ambiguous_language": {
-                "template": "⚠️ AMBIGUOUS LANGUAGE: {description}\n\nADGM Reference: {adgm_reference}\n\nSuggestion: {suggestion}",
-                "severity_color": "FF9900"  # Yellow
-            },
-            "missing_signatures": {
-                "template": "🚨 MISSING SIGNATURES: {description}\n\nADGM Reference: {adgm_reference}\n\nSuggestion: {suggestion}",
-                "severity_color": "FF0000"  # Red
-            },
-            "incomplete_info": {
-                "template": "⚠️ INCOMPLETE INFORMATION: {description}\n\nADGM Reference: {adgm_reference}\n\nSuggestion: {suggestion}",
-                "severity_color": "FF9900"  # Yellow
-            },
-            "non_compliant_structure": {
-                "template": "🚨 NON-COMPLIANT STRUCTURE: {description}\n\nADGM Reference: {adgm_reference}\n\nSuggestion: {suggestion}",
-                "severity_color": "FF0000"  # Red
-            },
-            "formatting_issue": {
-                "template": "ℹ️ FORMATTING ISSUE: {description}\n\nADGM Reference: {adgm_reference}\n\nSuggestion: {suggestion}",
-                "severity_color": "0066CC"  # Blue
-            }
-        }
+        # Every issue is attached to the first paragraph with content; find it once
+        # instead of rescanning the document for every issue
+        paragraphs = doc.paragraphs
+        target_paragraph = self._find_target_paragraph(paragraphs)
         
         # Add summary comment at the beginning
         summary_comment = self._create_summary_comment(issues)
-        if doc.paragraphs:
-            self.add_comment_to_paragraph(doc.paragraphs[0], summary_comment, "ADGM Agent")
+        if paragraphs:
+            self.add_comment_to_paragraph(paragraphs[0], summary_comment, "ADGM Agent")
         
         # Add specific comments for each issue
         for issue in issues:
             issue_type = issue.get("type", "unknown")
-            if issue_type in comment_templates:
-                template = comment_templates[issue_type]["template"]
-                comment_text = template.format(
-                    description=issue.get("description", ""),
-                    adgm_reference=issue.get("adgm_reference", "ADGM Companies Regulations 2020"),
-                    suggestion=issue.get("suggestion", "")
+            if issue_type in self.COMMENT_TEMPLATES:
+                comment_text = _format_issue_comment(
+                    self.COMMENT_TEMPLATES[issue_type]["header"],
+                    issue.get("description", ""),
+                    issue.get("adgm_reference", "ADGM Companies Regulations 2020"),
+                    issue.get("suggestion", "")
                 )
                 
-                # Find appropriate paragraph to comment on
-                target_paragraph = self._find_target_paragraph(doc, issue, document_text)
                 if target_paragraph:
                     self.add_comment_to_paragraph(target_paragraph, comment_text, "ADGM Agent")
         
@@ -108,10 +156,7 @@ class CommentInserter:
             return "✅ No issues found. Document appears to be compliant with ADGM requirements."
         
         # Count issues by severity
-        severity_counts = {"High": 0, "Medium": 0, "Low": 0}
-        for issue in issues:
-            severity = issue.get("severity", "Medium")
-            severity_counts[severity] += 1
+        severity_counts = Counter(issue.get("severity", "Medium") for issue in issues)
         
         summary = f"""📋 ADGM COMPLIANCE ANALYSIS SUMMARY
 
@@ -125,11 +170,10 @@ Please review all comments throughout the document for detailed recommendations.
         
         return summary
     
-    def _find_target_paragraph(self, doc: Document, issue: Dict[str, Any], 
-                             document_text: str) -> Any:
+    def _find_target_paragraph(self, paragraphs: List[Any]) -> Any:
         """Find the most appropriate paragraph to attach a comment to."""
         # For now, return the first paragraph with content
-        for paragraph in doc.paragraphs:
+        for paragraph in paragraphs:
             if paragraph.text.strip():
                 return paragraph
         
@@ -140,31 +184,46 @@ Please review all comments throughout the document for detailed recommendations.
         # This would require more sophisticated text matching
         # For now, we'll add a general highlighting approach
         
+        # Only jurisdiction and signature issues are highlighted; skip the sweep otherwise
+        issue_types = {issue.get("type") for issue in issues}
+        check_jurisdiction = "jurisdiction_issue" in issue_types
+        check_signatures = "missing_signatures" in issue_types
+        if not (check_jurisdiction or check_signatures):
+            return doc
+        
+        if check_jurisdiction and check_signatures:
+            pattern = self._HIGHLIGHT_RE
+        elif check_jurisdiction:
+            pattern = self._JURISDICTION_RE
+        else:
+            pattern = self._SIGNATURE_RE
+        
         for paragraph in doc.paragraphs:
-            text = paragraph.text.lower()
+            found = {match.lastgroup for match in pattern.finditer(paragraph.text.lower())}
             
-            # Highlight jurisdiction issues
-            if any(keyword in text for keyword in ["uae federal", "federal courts", "uae law"]):
+            # Highlight jurisdiction issues and signature mentions outside a signature block
+            if "jurisdiction" in found or ("signature" in found and "signature_block" not in found):
                 paragraph.style = 'Intense Quote'
-            
-            # Highlight missing signature indicators
-            if any(keyword in text for keyword in ["signature", "signed", "executed"]):
-                if not any(keyword in text for keyword in ["signature block", "signed by", "executed by"]):
-                    paragraph.style = 'Intense Quote'
         
         return doc
     
-    def create_reviewed_document(self, original_path: str, issues: List[Dict[str, Any]], 
+    def create_reviewed_document(self, original_path: Union[str, IO[bytes]], issues: List[Dict[str, Any]], 
                                output_path: str) -> str:
         """Create a reviewed version of the document with comments."""
         try:
             # Load original document
             doc = Document(original_path)
-            
+        except Exception as e:
+            raise Exception(f"Error creating reviewed document: {str(e)}")
+        
+        return self.create_reviewed_document_from_doc(doc, issues, output_path)
+    
+    def create_reviewed_document_from_doc(self, doc: Document, issues: List[Dict[str, Any]], 
+                                          output_path: str) -> str:
+        """Create a reviewed version of an already loaded document with comments."""
+        try:
             # Extract text for analysis
-            document_text = ""
-            for paragraph in doc.paragraphs:
-                document_text += paragraph.text + "\n"
+            document_text = "".join(paragraph.text + "\n" for paragraph in doc.paragraphs)
             
             # Insert comments based on issues
             doc = self.insert_comments_based_on_issues(doc, issues, document_text)
@@ -182,13 +241,7 @@ Please review all comments throughout the document for detailed recommendations.
     
     def generate_comment_text(self, issue: Dict[str, Any]) -> str:
         """Generate formatted comment text for an issue."""
-        severity_icons = {
-            "High": "🚨",
-            "Medium": "⚠️", 
-            "Low": "ℹ️"
-        }
-        
-        icon = severity_icons.get(issue.get("severity", "Medium"), "ℹ️")
+        icon = _SEVERITY_ICONS.get(issue.get("severity", "Medium"), "ℹ️")
         
         comment = f"""{icon} {issue.get('type', 'ISSUE').replace('_', ' ').upper()}
 
@@ -1,134 +1,265 @@
+import os
 import re
-from typing import Dict, List, Tuple, Optional
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from typing import IO, Any, Dict, FrozenSet, List, Set, Tuple, Optional, Union
+from lxml import etree
 from docx import Document
+from docx.oxml.ns import nsmap
 from docx.document import Document as DocumentType
-from docx.oxml.table import CT_Tbl
+from docx.oxml.table import CT_Row, CT_Tbl
 from docx.oxml.text.paragraph import CT_P
-from docx.table import _Cell, Table
-from docx.text.paragraph import Paragraph
+
+
+# Document type keywords for classification
+_DOC_TYPES: Dict[str, List[str]] = {
+    "Articles of Association": [
+        "articles of association", "articles", "aoa", "company constitution",
+        "share capital", "shareholders", "directors", "objects clause"
+    ],
+    "Memorandum of Association": [
+        "memorandum of association", "memorandum", "moa", "mou",
+        "company name", "registered office", "objects"
+    ],
+    "Board Resolution": [
+        "board resolution", "directors resolution", "board meeting",
+        "directors meeting", "resolution of directors"
+    ],
+    "Shareholder Resolution": [
+        "shareholder resolution", "shareholders resolution", "general meeting",
+        "extraordinary general meeting", "egm", "agm"
+    ],
+    "Incorporation Application": [
+        "incorporation application", "application for incorporation",
+        "company registration", "registration application"
+    ],
+    "UBO Declaration": [
+        "ubo declaration", "ultimate beneficial owner", "beneficial owner",
+        "ownership declaration", "shareholder declaration"
+    ],
+    "Register of Members and Directors": [
+        "register of members", "register of directors", "members register",
+        "directors register", "shareholder register"
+    ],
+    "Change of Registered Address": [
+        "change of address", "registered address", "address change",
+        "change of registered office"
+    ],
+    "Employment Contract": [
+        "employment contract", "employment agreement", "service agreement",
+        "terms of employment", "employee contract"
+    ],
+    "Licensing Application": [
+        "licensing application", "license application", "regulatory filing",
+        "compliance filing", "regulatory application"
+    ],
+    "Commercial Agreement": [
+        "commercial agreement", "commercial contract", "business agreement",
+        "service agreement", "supply agreement"
+    ],
+    "Compliance Policy": [
+        "compliance policy", "risk policy", "compliance framework",
+        "risk management", "compliance manual"
+    ]
+}
+
+# Every keyword once, shortest first, with the shorter keywords it contains;
+# a keyword can only be present if all of those were found first
+_KEYWORDS: List[str] = sorted(
+    {keyword for keywords in _DOC_TYPES.values() for keyword in keywords},
+    key=len
+)
+_CONTAINED_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    keyword: tuple(other for other in _KEYWORDS if other != keyword and other in keyword)
+    for keyword in _KEYWORDS
+}
+
+
+# Text-bearing run children, directly in the paragraph or inside hyperlinks; the
+# same elements python-docx joins for Paragraph.text, in one compiled query
+_RUN_TEXT = "*[self::w:br or self::w:cr or self::w:noBreakHyphen or self::w:ptab or self::w:t or self::w:tab]"
+_PARAGRAPH_TEXT_XPATH = etree.XPath(
+    f"./w:r/{_RUN_TEXT} | ./w:hyperlink/w:r/{_RUN_TEXT}",
+    namespaces={"w": nsmap["w"]}
+)
+
+
+def _paragraph_text(paragraph: CT_P) -> str:
+    """Text of a paragraph element, with tabs and line breaks mapped as python-docx does."""
+    return "".join(map(str, _PARAGRAPH_TEXT_XPATH(paragraph)))
+
+
+# Common section header patterns, combined into one pass. Repeats are bounded so
+# a long run of capitals cannot trigger heavy backtracking.
+_SECTION_RE = re.compile(
+    r'^('
+    r'[A-Z][A-Z\s]{0,79}\d*[.:]?(?=[ \t]*\n)'
+    r'|\d+\.\s*[A-Z][^.\n]+'
+    r'|[A-Z][A-Z\s]{0,79}(?:AND|OR|OF)\s[A-Z\s]{1,80}'
+    r')',
+    re.MULTILINE
+)
+
+_WORD_RE = re.compile(r'\S+')
+
+
+def _fast_wordcount(text: str) -> int:
+    """Count whitespace-separated words without building the list of words."""
+    return sum(1 for _ in _WORD_RE.finditer(text))
+
+
+# Documents required for each legal process
+_PROCESS_REQUIREMENTS: Dict[str, Tuple[str, ...]] = {
+    "Company Incorporation": (
+        "Articles of Association",
+        "Memorandum of Association",
+        "Incorporation Application",
+        "UBO Declaration",
+        "Register of Members and Directors"
+    ),
+    "Company Licensing": (
+        "Licensing Application",
+        "Articles of Association",
+        "Memorandum of Association",
+        "UBO Declaration",
+        "Compliance Policy"
+    ),
+    "Employment Setup": (
+        "Employment Contract",
+        "Board Resolution",
+        "Compliance Policy"
+    ),
+    "Commercial Agreement": (
+        "Commercial Agreement",
+        "Board Resolution",
+        "Shareholder Resolution"
+    )
+}
+
+# Documents whose presence points to each legal process
+_PROCESS_INDICATORS: Dict[str, FrozenSet[str]] = {
+    "Company Incorporation": frozenset({
+        "Articles of Association", "Memorandum of Association", "Incorporation Application"
+    }),
+    "Company Licensing": frozenset({"Licensing Application", "Compliance Policy"}),
+    "Employment Setup": frozenset({"Employment Contract"}),
+    "Commercial Agreement": frozenset({"Commercial Agreement"})
+}
+
+# Reverse index: the processes each document type points to
+_DOC_TO_PROCESSES: Dict[str, Tuple[str, ...]] = {
+    doc_type: tuple(process for process, indicators in _PROCESS_INDICATORS.items() if doc_type in indicators)
+    for indicators in _PROCESS_INDICATORS.values()
+    for doc_type in indicators
+}
+
+
+def _row_cell_texts(row: CT_Row) -> List[str]:
+    """Text of each layout-grid cell in a table row, in the order row.cells yields them."""
+    texts: List[str] = []
+    for tc in row.tc_lst:
+        # A vertically merged cell repeats the text of the cell it continues
+        while tc.vMerge == "continue":
+            tc = tc._tc_above
+        cell_text = "\n".join(_paragraph_text(p) for p in tc.p_lst)
+        texts.extend([cell_text] * tc.grid_span)
+    return texts
 
 
 class DocumentParser:
     """Parser for .docx legal documents with document type identification."""
     
-    def __init__(self):
-        # Document type keywords for classification
-        self.document_types = {
-            "Articles of Association": [
-                "articles of association", "articles", "aoa", "company constitution",
-                "share capital", "shareholders", "directors", "objects clause"
-            ],
-            "Memorandum of Association": [
-                "memorandum of association", "memorandum", "moa", "mou",
-                "company name", "registered office", "objects"
-            ],
-            "Board Resolution": [
-                "board resolution", "directors resolution", "board meeting",
-                "directors meeting", "resolution of directors"
-            ],
-            "Shareholder Resolution": [
-                "shareholder resolution", "shareholders resolution", "general meeting",
-                "extraordinary general meeting", "egm", "agm"
-            ],
-            "Incorporation Application": [
-                "incorporation application", "application for incorporation",
-                "company registration", "registration application"
-            ],
-            "UBO Declaration": [
-                "ubo declaration", "ultimate beneficial owner", "beneficial owner",
-                "ownership declaration", "shareholder declaration"
-            ],
-            "Register of Members and Directors": [
-                "register of members", "register of directors", "members register",
-                "directors register", "shareholder register"
-            ],
-            "Change of Registered Address": [
-                "change of address", "registered address", "address change",
-                "change of registered office"
-            ],
-            "Employment Contract": [
-                "employment contract", "employment agreement", "service agreement",
-                "terms of employment", "employee contract"
-            ],
-            "Licensing Application": [
-                "licensing application", "license application", "regulatory filing",
-                "compliance filing", "regulatory application"
-            ],
-            "Commercial Agreement": [
-                "commercial agreement", "commercial contract", "business agreement",
-                "service agreement", "supply agreement"
-            ],
-            "Compliance Policy": [
-                "compliance policy", "risk policy", "compliance framework",
-                "risk management", "compliance manual"
-            ]
-        }
+    # The parser holds no per-instance state; everything below is shared
+    __slots__ = ()
+    
+    # Document type keywords for classification
+    document_types: Dict[str, List[str]] = _DOC_TYPES
     
-    def extract_text_from_docx(self, file_path: str) -> str:
-        """Extract all text from a .docx file."""
+    # (document type, keywords, keyword count) for scoring, without per-call dict iteration
+    _SCORING_PLAN: Tuple[Tuple[str, Tuple[str, ...], int], ...] = tuple(
+        (doc_type, tuple(keywords), len(keywords)) for doc_type, keywords in _DOC_TYPES.items()
+    )
+    
+    def extract_text_from_docx(self, file_path: Union[str, IO[bytes]]) -> str:
+        """Extract all text from a .docx file path or file-like object."""
+        return self._read_docx(file_path)[1]
+    
+    def _read_docx(self, file_path: Union[str, IO[bytes]]) -> Tuple[DocumentType, str]:
+        """Open a .docx file and extract all of its text."""
         try:
             doc = Document(file_path)
-            text = []
+            text: List[str] = []
             
+            # Read the text straight off the XML elements; the python-docx
+            # Paragraph/Table/_Cell wrappers are only needed for editing
             for element in doc.element.body:
                 if isinstance(element, CT_P):
-                    paragraph = Paragraph(element, doc)
-                    text.append(paragraph.text)
+                    text.append(_paragraph_text(element))
                 elif isinstance(element, CT_Tbl):
-                    table = Table(element, doc)
-                    for row in table.rows:
-                        for cell in row.cells:
-                            text.append(cell.text)
+                    for row in element.tr_lst:
+                        text.extend(_row_cell_texts(row))
             
-            return '\n'.join(text)
+            return doc, '\n'.join(text)
         except Exception as e:
             raise Exception(f"Error parsing document {file_path}: {str(e)}")
     
     def identify_document_type(self, text: str) -> Tuple[str, float]:
         """Identify the most likely document type based on content."""
         text_lower = text.lower()
-        scores = {}
+        found = self._find_keywords(text_lower)
+        scores: Dict[str, float] = {}
         
-        for doc_type, keywords in self.document_types.items():
-            score = 0
-            for keyword in keywords:
-                if keyword in text_lower:
-                    score += 1
-            scores[doc_type] = score / len(keywords) if keywords else 0
+        for doc_type, keywords, keyword_count in self._SCORING_PLAN:
+            score = sum(1 for keyword in keywords if keyword in found)
+            scores[doc_type] = score / keyword_count if keyword_count else 0
         
         # Find the document type with highest score
-        best_type = max(scores.items(), key=lambda x: x[1])
-        return best_type[0], best_type[1]
+        best_score = max(scores.values())
+        tied = [doc_type for doc_type, score in scores.items() if score == best_score]
+        if len(tied) > 1 and best_score > 0:
+            # Break ties on how often each type's keywords occur, not just whether they do
+            best_type = max(tied, key=lambda doc_type: sum(
+                text_lower.count(keyword) for keyword in self.document_types[doc_type] if keyword in found
+            ))
+        else:
+            best_type = tied[0]
+        return best_type, best_score
+    
+    def _find_keywords(self, text_lower: str) -> Set[str]:
+        """Return the classification keywords present in the lowercased text."""
+        found: Set[str] = set()
+        for keyword in _KEYWORDS:
+            # Skip the scan when a keyword contained in this one is already missing
+            if all(other in found for other in _CONTAINED_KEYWORDS[keyword]) and keyword in text_lower:
+                found.add(keyword)
+        return found
     
     def extract_sections(self, text: str) -> Dict[str, str]:
         """Extract document sections based on common legal document structure."""
-        sections = {}
-        
-        # Common section patterns
-        section_patterns = [
-            r'(?:^|\n)([A-Z][A-Z\s]+(?:CLAUSE|SECTION|ARTICLE)?\s*\d*[.:]?)\s*\n',
-            r'(?:^|\n)(\d+\.\s*[A-Z][^.\n]+)',
-            r'(?:^|\n)([A-Z][A-Z\s]+(?:AND|OR|OF)\s+[A-Z\s]+)',
-        ]
+        sections: Dict[str, str] = {}
         
-        for pattern in section_patterns:
-            matches = re.finditer(pattern, text, re.MULTILINE)
-            for match in matches:
-                section_title = match.group(1).strip()
-                # Get content until next section or end
-                start_pos = match.end()
-                next_match = re.search(pattern, text[start_pos:], re.MULTILINE)
-                end_pos = start_pos + next_match.start() if next_match else len(text)
-                section_content = text[start_pos:end_pos].strip()
+        # Walk the headers once; each section runs until the next header, so a
+        # section is stored when the header after it (or the end of text) is reached
+        previous = None
+        for match in chain(_SECTION_RE.finditer(text), (None,)):
+            if previous is not None:
+                end_pos = match.start() if match is not None else len(text)
+                section_content = text[previous.end():end_pos].strip()
                 
                 if section_content:
-                    sections[section_title] = section_content
+                    sections[previous.group(1).strip()] = section_content
+            previous = match
         
         return sections
     
-    def parse_document(self, file_path: str) -> Dict:
-        """Parse a document and return structured information."""
-        text = self.extract_text_from_docx(file_path)
+    def parse_document(self, file_path: Union[str, IO[bytes]]) -> Dict[str, Any]:
+        """Parse a document from a path or file-like object and return structured information.
+        
+        The opened document is returned under "doc" so callers can reuse it
+        instead of loading the file again; drop it before serializing.
+        """
+        doc, text = self._read_docx(file_path)
         doc_type, confidence = self.identify_document_type(text)
         sections = self.extract_sections(text)
         
@@ -138,59 +269,40 @@ class DocumentParser:
             "confidence": confidence,
             "text": text,
             "sections": sections,
-            "word_count": len(text.split())
+            "word_count": _fast_wordcount(text),
+            "doc": doc
         }
     
-    def get_required_documents_for_process(self, process: str) -> List[str]:
-        """Get list of required documents for a specific legal process."""
-        process_requirements = {
-            "Company Incorporation": [
-                "Articles of Association",
-                "Memorandum of Association", 
-                "Incorporation Application",
-                "UBO Declaration",
-                "Register of Members and Directors"
-            ],
-            "Company Licensing": [
-                "Licensing Application",
-                "Articles of Association",
-                "Memorandum of Association",
-                "UBO Declaration",
-                "Compliance Policy"
-            ],
-            "Employment Setup": [
-                "Employment Contract",
-                "Board Resolution",
-                "Compliance Policy"
-            ],
-            "Commercial Agreement": [
-                "Commercial Agreement",
-                "Board Resolution",
-                "Shareholder Resolution"
-            ]
-        }
+    def parse_documents(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+        """Parse several documents across worker processes, in the order given.
         
-        return process_requirements.get(process, [])
+        Unlike parse_document, the results carry no "doc": loaded documents
+        cannot be sent back from the workers.
+        """
+        if len(file_paths) <= 1:
+            return [_parse_document_without_doc(file_path) for file_path in file_paths]
+        
+        with ProcessPoolExecutor(max_workers=min(len(file_paths), os.cpu_count() or 1)) as executor:
+            return list(executor.map(_parse_document_without_doc, file_paths, chunksize=4))
+    
+    def get_required_documents_for_process(self, process: str) -> Tuple[str, ...]:
+        """Get the required documents for a specific legal process."""
+        return _PROCESS_REQUIREMENTS.get(process, ())
     
     def detect_process_from_documents(self, document_types: List[str]) -> str:
         """Detect the legal process based on uploaded documents."""
-        process_scores = {
-            "Company Incorporation": 0,
-            "Company Licensing": 0,
-            "Employment Setup": 0,
-            "Commercial Agreement": 0
-        }
-        
         # Score each process based on document presence
+        process_scores: "Counter[str]" = Counter()
         for doc_type in document_types:
-            if doc_type in ["Articles of Association", "Memorandum of Association", "Incorporation Application"]:
-                process_scores["Company Incorporation"] += 1
-            if doc_type in ["Licensing Application", "Compliance Policy"]:
-                process_scores["Company Licensing"] += 1
-            if doc_type in ["Employment Contract"]:
-                process_scores["Employment Setup"] += 1
-            if doc_type in ["Commercial Agreement"]:
-                process_scores["Commercial Agreement"] += 1
+            for process in _DOC_TO_PROCESSES.get(doc_type, ()):
+                process_scores[process] += 1
         
-        # Return the process with highest score
-        return max(process_scores.items(), key=lambda x: x[1])[0]
+        # Return the process with highest score; ties go to the first listed process
+        return max(_PROCESS_INDICATORS, key=lambda process: process_scores[process])
+
+
+def _parse_document_without_doc(file_path: str) -> Dict[str, Any]:
+    """Process pool entry point for parse_documents."""
+    result = DocumentParser().parse_document(file_path)
+    result.pop("doc")
+    return result
@@ -0,0 +1,105 @@
+import io
+import os
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+import orjson
+from docx.document import Document as DocxDocument
+
+from doc_parser import DocumentParser
+from redfalg_checker import RedFlagChecker
+from comment_inserter import CommentInserter
+from analysis_cache import AnalysisCache
+
+
+def parsed_output_path(file_name: str) -> str:
+    """Path of the parsed JSON output for an uploaded file."""
+    json_filename = f"{os.path.splitext(file_name)[0]}_output.json"
+    return os.path.join("outputs", json_filename)
+
+
+def reviewed_output_path(document_type: str) -> str:
+    """Timestamped path for a reviewed document.
+
+    Microseconds are included so documents reviewed in parallel, or copied for
+    duplicate uploads, within the same second do not overwrite each other.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    output_filename = f"reviewed_{document_type.replace(' ', '_')}_{timestamp}.docx"
+    return os.path.join("outputs", output_filename)
+
+
+def create_reviewed_document(comment_inserter: CommentInserter, doc: DocxDocument,
+                             issues: List[Dict], document_type: str) -> str:
+    """Create a reviewed version of the document in the outputs folder."""
+    output_path = reviewed_output_path(document_type)
+
+    return comment_inserter.create_reviewed_document_from_doc(doc, issues, output_path)
+
+
+def process_document(file_bytes: bytes, file_name: str, parser: DocumentParser,
+                     red_flag_checker: RedFlagChecker,
+                     comment_inserter: CommentInserter,
+                     analysis_cache: AnalysisCache) -> Tuple[Dict[str, Any], str, Optional[str]]:
+    """Parse, red-flag check and annotate a single uploaded document.
+
+    Returns the document result, the extracted text and an error message if the
+    reviewed document could not be created. The RAG analysis is left to the caller
+    so that LLM calls stay in the main process.
+    """
+    # Parse document straight from memory; keep the loaded document for the reviewed copy
+    doc_info = parser.parse_document(io.BytesIO(file_bytes))
+    doc_info["file_path"] = file_name
+    doc = doc_info.pop("doc")
+
+    # --- Save parsed output as JSON ---
+    json_path = parsed_output_path(file_name)
+    with open(json_path, "wb") as f:
+        f.write(orjson.dumps(doc_info, option=orjson.OPT_INDENT_2))
+    # ----------------------------------
+
+    # Analyze for red flags (cached on document content)
+    red_flag_analysis = analysis_cache.get_or_compute(
+        "red_flags",
+        doc_info["text"],
+        doc_info["document_type"],
+        red_flag_checker.analyze_document
+    )
+
+    # Create reviewed document with comments
+    reviewed_path = None
+    reviewed_error = None
+    try:
+        reviewed_path = create_reviewed_document(
+            comment_inserter,
+            doc,
+            red_flag_analysis["issues"],
+            doc_info["document_type"]
+        )
+    except Exception as e:
+        reviewed_error = str(e)
+
+    document_result = {
+        "file_name": file_name,
+        "document_type": doc_info["document_type"],
+        "confidence": doc_info["confidence"],
+        "word_count": doc_info["word_count"],
+        "red_flag_analysis": red_flag_analysis,
+        "rag_analysis": None,
+        "reviewed_file_path": reviewed_path,
+        "json_output_path": json_path  # Optionally add this for reference
+    }
+
+    return document_result, doc_info["text"], reviewed_error
+
+
+def process_document_in_worker(file_bytes: bytes, file_name: str) -> Tuple[Dict[str, Any], str, Optional[str]]:
+    """Process pool entry point; builds its own components so nothing is pickled but the bytes."""
+    return process_document(
+        file_bytes,
+        file_name,
+        DocumentParser(),
+        RedFlagChecker(),
+        CommentInserter(),
+        AnalysisCache()
+    )
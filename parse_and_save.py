@@ -1,19 +1,36 @@
 import os
-import json
+from pathlib import Path
+from typing import Dict
+import orjson
 from doc_parser import DocumentParser
 
-def parse_and_save(input_file: str):
+def _sections_cover_text(text: str, sections: Dict[str, str]) -> bool:
+    """Return True if the headers and section bodies hold all of the text.
+    
+    Titles, text before the first header, headers without a body and repeated
+    headers are not kept in the sections.
+    """
+    rebuilt = "".join(f"{header}{content}" for header, content in sections.items())
+    return "".join(rebuilt.split()) == "".join(text.split())
+
+def parse_and_save(input_file: str, include_text: bool = True):
     parser = DocumentParser()
     result = parser.parse_document(input_file)
+    result.pop("doc")
+    
+    # The full text is optional, but only dropped when the sections carry all of it
+    if not include_text and _sections_cover_text(result["text"], result["sections"]):
+        result.pop("text")
     
     # Create output file path (same folder, .json extension)
-    folder = os.path.dirname(input_file)
-    base = os.path.splitext(os.path.basename(input_file))[0]
-    output_file = os.path.join(folder, f"{base}_output.json")
+    input_path = Path(input_file)
+    output_file = input_path.with_name(f"{input_path.stem}_output.json")
     
-    # Save result as JSON
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(result, f, indent=2, ensure_ascii=False)
+    # Save result as JSON; write to a temporary file first so readers never see a partial file
+    temp_file = output_file.with_name(f"{output_file.name}.tmp")
+    with temp_file.open("wb", buffering=1 << 20) as f:
+        f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+    os.replace(temp_file, output_file)
     
     print(f"Output saved to: {output_file}")
 
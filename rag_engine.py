@@ -1,11 +1,41 @@
 import os
 import json
-from typing import List, Dict, Any
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple, Union
+import groq
+import httpx
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_groq import ChatGroq
-from langchain.schema import Document
+from langchain.schema import BaseMessage, Document, HumanMessage, SystemMessage
+
+
+# A plain prompt or a list of chat messages
+Prompt = Union[str, List[BaseMessage]]
+
+# Fields requested from the LLM for each compliance analysis
+_ANALYSIS_FIELDS = """- compliance_issues: List of compliance problems found
+- red_flags: List of red flags identified
+- missing_sections: List of missing required sections
+- jurisdiction_issues: List of jurisdiction-related problems
+- suggestions: List of improvement suggestions
+- adgm_references: List of specific ADGM regulation references
+- severity: Overall severity level (Low/Medium/High)"""
+
+
+# Keep-alive connection pool for the Groq API, shared by every engine in the process
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=16, max_connections=32)
+_HTTP_TIMEOUT = 30.0
+
+
+@lru_cache(maxsize=1)
+def _shared_http_client() -> httpx.Client:
+    """Return the process-wide HTTP client used for LLM requests."""
+    return httpx.Client(limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT)
 
 
 class RAGEngine:
@@ -24,22 +54,31 @@ class RAGEngine:
                 "Get your API key from: https://console.groq.com/"
             )
         
-        # Initialize TF-IDF vectorizer for simple text similarity
-        self.vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
-        
-        # Initialize LLM with Groq
+        # Initialize LLM with Groq; synchronous calls reuse the process-wide connection pool
         self.llm = ChatGroq(
             model_name="llama3-8b-8192",
             temperature=0.1,
-            groq_api_key=self.groq_api_key
+            groq_api_key=self.groq_api_key,
+            max_retries=2,
+            client=groq.Groq(
+                api_key=self.groq_api_key,
+                max_retries=2,
+                timeout=_HTTP_TIMEOUT,
+                http_client=_shared_http_client()
+            ).chat.completions
         )
         
+        # LLM responses keyed on a digest of the prompt, least recently used first
+        self._response_cache = OrderedDict()
+        self._response_cache_size = 512
+        self._response_cache_lock = threading.Lock()  # the engine is shared by session threads
+        
         # ADGM legal knowledge base
-        self.adgm_knowledge = self._load_adgm_knowledge()
         self.vector_store = None
         self._initialize_vector_store()
     
-    def _load_adgm_knowledge(self) -> List[Document]:
+    @staticmethod
+    def _load_adgm_knowledge() -> List[Document]:
         """Load ADGM legal knowledge and regulations."""
         knowledge_base = [
             # ADGM Companies Regulations 2020
@@ -172,27 +211,13 @@ class RAGEngine:
         return knowledge_base
     
     def _initialize_vector_store(self):
-        """Initialize the TF-IDF vector store with ADGM knowledge."""
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
+        """Initialize the TF-IDF vector store with ADGM knowledge.
         
-        # Split documents into chunks
-        self.texts = []
-        self.documents = []
-        for doc in self.adgm_knowledge:
-            chunks = text_splitter.split_text(doc.page_content)
-            for chunk in chunks:
-                self.texts.append(chunk)
-                self.documents.append(Document(
-                    page_content=chunk,
-                    metadata=doc.metadata
-                ))
-        
-        # Create TF-IDF matrix
-        if self.texts:
-            self.tfidf_matrix = self.vectorizer.fit_transform(self.texts)
+        The knowledge base is static, so the index is built once per process and
+        shared by every engine.
+        """
+        (self.adgm_knowledge, self.vectorizer, self.tfidf_transformer,
+         self.documents, self.tfidf_matrix) = _build_index()
     
     def get_relevant_context(self, query: str, k: int = 5) -> List[Document]:
         """Retrieve relevant ADGM legal context for a query using TF-IDF similarity."""
@@ -200,60 +225,54 @@ class RAGEngine:
             raise ValueError("Vector store not initialized")
         
         # Transform query to TF-IDF
-        query_vector = self.vectorizer.transform([query])
+        query_vector = self.tfidf_transformer.transform(self.vectorizer.transform([query]))
         
-        # Calculate cosine similarity
-        similarities = cosine_similarity(query_vector, self.tfidf_matrix).flatten()
+        # Rows and query are L2-normalised, so cosine similarity is a single product
+        similarities = (self.tfidf_matrix @ query_vector.T).toarray().ravel()
         
-        # Get top k most similar documents
-        top_indices = similarities.argsort()[-k:][::-1]
+        # Get top k most similar documents; only the k best are sorted
+        n = similarities.shape[0]
+        if k < n:
+            top_indices = np.argpartition(-similarities, k - 1)[:k]
+        else:
+            top_indices = np.arange(n)
+        top_indices = top_indices[np.argsort(-similarities[top_indices], kind="stable")]
         
         return [self.documents[i] for i in top_indices]
     
-    def analyze_document_compliance(self, document_text: str, document_type: str) -> Dict[str, Any]:
-        """Analyze document compliance with ADGM regulations."""
-        query = f"""
-        Analyze the following {document_type} for ADGM compliance:
-        
-        Document Type: {document_type}
-        Document Content: {document_text[:2000]}...
-        
-        Please identify:
-        1. Compliance issues and red flags
-        2. Missing required sections
-        3. Jurisdiction problems
-        4. Specific ADGM regulation violations
-        5. Suggestions for improvement
-        
-        Provide specific references to ADGM regulations where applicable.
-        """
-        
-        # Get relevant context
-        context_docs = self.get_relevant_context(query)
-        context = "\n\n".join([doc.page_content for doc in context_docs])
-        
-        # Generate analysis using LLM
-        prompt = f"""
-        Based on the following ADGM legal context and the document analysis request:
-        
-        ADGM Context:
-        {context}
-        
-        Analysis Request:
-        {query}
-        
-        Please provide a structured analysis in JSON format with the following fields:
-        - compliance_issues: List of compliance problems found
-        - red_flags: List of red flags identified
-        - missing_sections: List of missing required sections
-        - jurisdiction_issues: List of jurisdiction-related problems
-        - suggestions: List of improvement suggestions
-        - adgm_references: List of specific ADGM regulation references
-        - severity: Overall severity level (Low/Medium/High)
-        """
-        
-        response = self.llm.predict(prompt)
+    def _compliance_request(self, document_text: str, document_type: str) -> str:
+        """Build the compliance analysis request for a single document."""
+        return (
+            f"Analyze the following {document_type} for ADGM compliance.\n\n"
+            f"Document Content:\n{document_text[:2000]}\n\n"
+            "Identify compliance issues and red flags, missing required sections, jurisdiction "
+            "problems and specific ADGM regulation violations, and suggest improvements with "
+            "references to ADGM regulations where applicable."
+        )
+    
+    def _context_message(self, document_texts: List[str]) -> SystemMessage:
+        """Build the system message carrying the ADGM context relevant to the documents."""
+        # Retrieve on the documents themselves, without repeating shared chunks
+        context_chunks = []
+        for document_text in document_texts:
+            for doc in self.get_relevant_context(document_text[:1000], k=3):
+                if doc.page_content not in context_chunks:
+                    context_chunks.append(doc.page_content)
+        context = "\n\n".join(context_chunks)
+        
+        return SystemMessage(content=f"You review legal documents for ADGM compliance.\n\nADGM Context:\n{context}")
+    
+    def _compliance_messages(self, document_text: str, document_type: str) -> List[BaseMessage]:
+        """Build the LLM messages, with ADGM context, for a single document."""
+        request = self._compliance_request(document_text, document_type)
         
+        return [
+            self._context_message([document_text]),
+            HumanMessage(content=f"{request}\n\nRespond in JSON format with the following fields:\n{_ANALYSIS_FIELDS}")
+        ]
+    
+    def _parse_analysis(self, response: str) -> Dict[str, Any]:
+        """Parse an LLM compliance response, falling back to an empty analysis."""
         try:
             # Try to parse JSON response
             analysis = json.loads(response)
@@ -272,6 +291,114 @@ class RAGEngine:
         
         return analysis
     
+    def _prompt_key(self, prompt: Prompt) -> bytes:
+        if not isinstance(prompt, str):
+            prompt = "\n".join(f"{message.type}: {message.content}" for message in prompt)
+        return hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).digest()
+    
+    def _cached_response(self, key: bytes):
+        with self._response_cache_lock:
+            response = self._response_cache.get(key)
+            if response is not None:
+                self._response_cache.move_to_end(key)
+        return response
+    
+    def _remember_response(self, key: bytes, response: str):
+        with self._response_cache_lock:
+            self._response_cache[key] = response
+            self._response_cache.move_to_end(key)
+            if len(self._response_cache) > self._response_cache_size:
+                self._response_cache.popitem(last=False)
+    
+    def clear_cache(self):
+        """Forget cached LLM responses, so the next identical prompt calls the model again."""
+        with self._response_cache_lock:
+            self._response_cache.clear()
+    
+    def _complete(self, prompt: Prompt) -> str:
+        """Return the LLM response for a prompt, reusing the response to an identical prompt."""
+        key = self._prompt_key(prompt)
+        response = self._cached_response(key)
+        if response is None:
+            response = self.llm.invoke(prompt).content
+            self._remember_response(key, response)
+        return response
+    
+    def _complete_many(self, prompts: List[Prompt]) -> List[str]:
+        """Return the LLM responses for several prompts, sending the uncached ones concurrently.
+        
+        The requests run on threads over the shared keep-alive sync client; an async
+        client would be bound to a single event loop and break across asyncio.run calls.
+        """
+        keys = [self._prompt_key(prompt) for prompt in prompts]
+        
+        responses = {}
+        pending = {}
+        for key, prompt in zip(keys, prompts):
+            if key in responses or key in pending:
+                continue
+            response = self._cached_response(key)
+            if response is None:
+                pending[key] = prompt
+            else:
+                responses[key] = response
+        
+        if pending:
+            messages = self.llm.batch(list(pending.values()))
+            for key, message in zip(pending, messages):
+                responses[key] = message.content
+                self._remember_response(key, message.content)
+        
+        return [responses[key] for key in keys]
+    
+    def analyze_many(self, documents: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """Analyze several (document_text, document_type) pairs with concurrent LLM requests."""
+        prompts = [self._compliance_messages(text, doc_type) for text, doc_type in documents]
+        responses = self._complete_many(prompts)
+        return [self._parse_analysis(response) for response in responses]
+    
+    def analyze_document_compliance(self, document_text: str, document_type: str) -> Dict[str, Any]:
+        """Analyze document compliance with ADGM regulations."""
+        prompt = self._compliance_messages(document_text, document_type)
+        
+        # Generate analysis using LLM
+        response = self._complete(prompt)
+        
+        return self._parse_analysis(response)
+    
+    def analyze_batch(self, documents: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """Analyze several (document_text, document_type) pairs in a single LLM request.
+        
+        Falls back to concurrent per-document requests if the batched request fails
+        or its response cannot be parsed into one analysis per document.
+        """
+        if len(documents) <= 1:
+            return [self.analyze_document_compliance(text, doc_type) for text, doc_type in documents]
+        
+        requests = "\n".join(
+            f"<doc id={i}>{self._compliance_request(text, doc_type)}</doc>"
+            for i, (text, doc_type) in enumerate(documents)
+        )
+        
+        prompt = [
+            self._context_message([text for text, _ in documents]),
+            HumanMessage(content=(
+                f"{requests}\n\nRespond with a JSON array with exactly one object per document, "
+                f"in document id order. Each object must have the following fields:\n{_ANALYSIS_FIELDS}"
+            ))
+        ]
+        
+        try:
+            analyses = json.loads(self._complete(prompt))
+        except Exception:
+            analyses = None
+        
+        if (not isinstance(analyses, list) or len(analyses) != len(documents)
+                or not all(isinstance(analysis, dict) for analysis in analyses)):
+            return self.analyze_many(documents)
+        
+        return analyses
+    
     def generate_legal_suggestions(self, issue: str, document_type: str) -> str:
         """Generate legal suggestions for specific issues."""
         query = f"Provide ADGM-compliant suggestions for {issue} in {document_type}"
@@ -294,7 +421,7 @@ class RAGEngine:
         3. Implementation guidance
         """
         
-        response = self.llm.predict(prompt)
+        response = self._complete(prompt)
         return response
     
     def validate_jurisdiction_clauses(self, text: str) -> Dict[str, Any]:
@@ -320,7 +447,7 @@ class RAGEngine:
         Provide specific issues and corrections.
         """
         
-        response = self.llm.predict(prompt)
+        response = self._complete(prompt)
         return {"analysis": response, "context": context}
     
     def get_adgm_reference(self, topic: str) -> str:
@@ -331,3 +458,50 @@ class RAGEngine:
         if context_docs:
             return context_docs[0].page_content
         return f"No specific ADGM reference found for {topic}"
+
+
+def _strip_indentation(text: str) -> str:
+    """Drop the source-code indentation of a knowledge chunk so it is not sent to the LLM."""
+    return "\n".join(line.strip() for line in text.splitlines())
+
+
+@lru_cache(maxsize=1)
+def _build_index() -> Tuple[List[Document], HashingVectorizer, TfidfTransformer, List[Document], Any]:
+    """Split the ADGM knowledge into chunks and fit the TF-IDF index over them."""
+    adgm_knowledge = RAGEngine._load_adgm_knowledge()
+    
+    # Stateless hashed term counts; no vocabulary lookups at query time. float32 halves
+    # the index size, and cosine ranking does not need double precision
+    vectorizer = HashingVectorizer(
+        n_features=2 ** 14,
+        norm=None,
+        alternate_sign=False,
+        stop_words='english',
+        dtype=np.float32
+    )
+    
+    # Only build the splitter if some document is too long to be a single chunk
+    chunk_size = 1000
+    text_splitter = None
+    if any(len(doc.page_content) > chunk_size for doc in adgm_knowledge):
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=200
+        )
+    
+    # Split documents into chunks; the chunk text lives only on the Document
+    documents = []
+    for doc in adgm_knowledge:
+        content = doc.page_content
+        chunks = [content.strip()] if len(content) <= chunk_size else text_splitter.split_text(content)
+        for chunk in chunks:
+            documents.append(Document(page_content=_strip_indentation(chunk), metadata=doc.metadata))
+    
+    # Create the L2-normalised TF-IDF matrix
+    tfidf_transformer = TfidfTransformer()
+    tfidf_matrix = None
+    if documents:
+        counts = vectorizer.transform(doc.page_content for doc in documents)
+        tfidf_matrix = tfidf_transformer.fit_transform(counts).tocsr()
+    
+    return adgm_knowledge, vectorizer, tfidf_transformer, documents, tfidf_matrix
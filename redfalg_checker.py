@@ -1,8 +1,128 @@
+import hashlib
+import os
 import re
-from typing import List, Dict, Any, Tuple
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Dict, Any, FrozenSet, Optional, Set, Tuple
+import orjson
 from doc_parser import DocumentParser
 
 
+# References repeated across issues; every issue shares these string objects
+_ADGM_REF = "ADGM Companies Regulations 2020"
+_ADGM_DOCUMENT_STANDARDS = "ADGM Document Standards"
+
+
+# Severity scores, and the overall severity for each highest score (0 when no issues)
+_SEVERITY_SCORES = {"Low": 1, "Medium": 2, "High": 3}
+_SEVERITY_LEVELS = ("Low", "Low", "Medium", "High")
+
+
+# Clause numbering such as "1."; a single digit before the dot is enough to find one
+_NUMBERING_RE = re.compile(r"\d\.")
+
+
+# Summary count keys and the issue type each one counts
+_SUMMARY_KEYS = (
+    ("jurisdiction_issues", "jurisdiction_issue"),
+    ("missing_clauses", "missing_clause"),
+    ("ambiguous_language", "ambiguous_language"),
+    ("missing_signatures", "missing_signatures"),
+    ("incomplete_info", "incomplete_info"),
+    ("non_compliant_structures", "non_compliant_structure"),
+    ("formatting_issues", "formatting_issue")
+)
+
+
+# Fixed fields of the issues reported per match; "description" and "location"
+# are placeholders filled in by each match, keeping the key order of the issue.
+# The location only feeds the "section" column of the app's structured report,
+# but matches are still found with their offsets to fill it.
+_ISSUE_TEMPLATES = {
+    "jurisdiction_issue": {
+        "type": "jurisdiction_issue",
+        "severity": "High",
+        "description": "Reference to UAE Federal Courts instead of ADGM",
+        "location": None,
+        "suggestion": "Replace with ADGM jurisdiction references",
+        "adgm_reference": "ADGM Companies Regulations 2020, Article 6"
+    },
+    "ambiguous_language": {
+        "type": "ambiguous_language",
+        "severity": "Medium",
+        "description": None,
+        "location": None,
+        "suggestion": "Replace with specific, binding language",
+        "adgm_reference": _ADGM_REF
+    },
+    "incomplete_info": {
+        "type": "incomplete_info",
+        "severity": "Medium",
+        "description": None,
+        "location": None,
+        "suggestion": "Complete all required information before submission",
+        "adgm_reference": _ADGM_REF
+    },
+    "non_compliant_structure": {
+        "type": "non_compliant_structure",
+        "severity": "High",
+        "description": None,
+        "location": None,
+        "suggestion": "Review structure for ADGM compliance",
+        "adgm_reference": _ADGM_REF
+    }
+}
+
+
+def _required_literal(pattern: str) -> str:
+    """Longest lower-cased literal that every match of a simple pattern contains.
+    
+    Returns an empty string, which is found in any text, when there is no such literal.
+    """
+    if re.search(r"(?<!\\)[|(\[{]", pattern):
+        return ""
+    
+    # Drop escapes and quantified characters; the remaining letters are literal.
+    # "i" and "s" also split fragments as they match "ı" and "ſ" under IGNORECASE.
+    literal_text = re.sub(r"\\.|.[?*+]", " ", pattern).lower()
+    return max(re.split(r"[^a-hj-rt-z0-9_]+", literal_text), key=len)
+
+
+def _lowercase_pattern(pattern: str) -> str:
+    """Lower-case the literal letters of a pattern, leaving escapes such as \\S alone."""
+    return re.sub(r"(\\.)|[A-Z]+", lambda match: match.group(1) or match.group().lower(), pattern)
+
+
+def _finditer_dot_star(pattern: re.Pattern, head: re.Pattern, text: str) -> Iterator[re.Match]:
+    """Same matches as pattern.finditer(text) for a pattern of the form head.*tail.
+    
+    finditer retries the pattern at every head, each retry scanning to the end of
+    the line for the tail. Once the tail is missing from the rest of a line, later
+    heads on that line cannot match either and are skipped, keeping the scan linear.
+    """
+    pos = 0
+    dead_until = -1
+    while True:
+        head_match = head.search(text, pos)
+        if head_match is None:
+            return
+        
+        start, head_end = head_match.span()
+        if head_end > dead_until:
+            match = pattern.match(text, start)
+            if match is not None:
+                yield match
+                pos = match.end()
+                continue
+            
+            # ".*" cannot cross a newline, so the rest of this line has no tail
+            dead_until = text.find("\n", head_end)
+            if dead_until == -1:
+                dead_until = len(text)
+        pos = start + 1
+
+
 class RedFlagChecker:
     """Detects red flags and compliance issues in legal documents."""
     
@@ -59,6 +179,13 @@ class RedFlagChecker:
             ]
         }
         
+        # Patterns are compiled per category on first use, so checks that never run
+        # cost nothing
+        self._compiled_red_flags = {}
+        
+        # Compiled patterns with an unbounded ".*", mapped to the part before it
+        self._dot_star_heads = {}
+        
         # ADGM-specific compliance requirements
         self.adgm_requirements = {
             "Articles of Association": [
@@ -91,121 +218,175 @@ class RedFlagChecker:
                 "supporting documentation"
             ]
         }
+        
+        # Lower-cased search text of each required clause, paired with the issue
+        # reported when it is missing
+        self._clause_lookups = {
+            document_type: [
+                (clause.lower(), {
+                    "type": "missing_clause",
+                    "severity": "High",
+                    "description": f"Missing required clause: {clause}",
+                    "suggestion": f"Add {clause} section to comply with ADGM requirements",
+                    "adgm_reference": _ADGM_REF
+                })
+                for clause in clauses
+            ]
+            for document_type, clauses in self.adgm_requirements.items()
+        }
+        
+        # Recent analyses as orjson payloads, keyed on text digest and document type
+        self._analysis_cache = OrderedDict()
+        self._analysis_cache_size = 128
+        self._analysis_cache_lock = threading.Lock()  # the checker is shared by session threads
     
-    def check_jurisdiction_issues(self, text: str) -> List[Dict[str, Any]]:
+    def _compiled_patterns(self, category: str) -> List[Tuple[re.Pattern, re.Pattern, str]]:
+        """Compile a category's patterns, once.
+        
+        Each entry holds the IGNORECASE pattern, a case-sensitive lower-cased copy for
+        scanning lower-cased text and the literal every match must contain.
+        """
+        compiled = self._compiled_red_flags.get(category)
+        if compiled is None:
+            compiled = self._compiled_red_flags[category] = [
+                (re.compile(pattern, re.IGNORECASE), re.compile(_lowercase_pattern(pattern)),
+                 _required_literal(pattern))
+                for pattern in self.red_flags[category]
+            ]
+            for pattern, lowered_pattern, _ in compiled:
+                for variant in (pattern, lowered_pattern):
+                    if ".*" in variant.pattern:
+                        head = variant.pattern.split(".*", 1)[0]
+                        self._dot_star_heads[variant] = re.compile(head, variant.flags)
+        return compiled
+    
+    def _find_matches(self, category: str, text: str, text_lower: str) -> Iterator[re.Match]:
+        """Yield the matches of a category's patterns in text, pattern by pattern.
+        
+        Matches may be made against text_lower, so callers take matched text from
+        text by the match span rather than from the match itself.
+        """
+        # When lower-casing kept every character in place (only "İ" grows), the
+        # case-sensitive lower-cased patterns find on text_lower exactly the spans
+        # IGNORECASE finds on text, except for "ı" and "ſ" which IGNORECASE also
+        # matches as "i" and "s". Unlike IGNORECASE they let the regex engine search
+        # for their literal prefix. isascii() is a flag check on ASCII-only text.
+        use_lowered = len(text) == len(text_lower) and (
+            text_lower.isascii() or ("ı" not in text_lower and "ſ" not in text_lower)
+        )
+        scan_text = text_lower if use_lowered else text
+        
+        # Separate scans beat a fused alternation here: each pattern has a literal
+        # prefix the regex engine can search for, which an alternation loses.
+        # Patterns sharing a required literal only test for it once, and a substring
+        # test is far cheaper than a regex scan.
+        literal_found = {}
+        for pattern, lowered_pattern, literal in self._compiled_patterns(category):
+            found = literal_found.get(literal)
+            if found is None:
+                found = literal_found[literal] = literal in text_lower
+            if not found:
+                continue
+            
+            if use_lowered:
+                pattern = lowered_pattern
+            head = self._dot_star_heads.get(pattern)
+            if head is None:
+                yield from pattern.finditer(scan_text)
+            else:
+                yield from _finditer_dot_star(pattern, head, scan_text)
+    
+    def check_jurisdiction_issues(self, text: str, text_lower: Optional[str] = None) -> List[Dict[str, Any]]:
         """Check for jurisdiction-related red flags."""
         issues = []
-        text_lower = text.lower()
+        if text_lower is None:
+            text_lower = text.lower()
         
-        for pattern in self.red_flags["jurisdiction_issues"]:
-            matches = re.finditer(pattern, text_lower, re.IGNORECASE)
-            for match in matches:
-                issues.append({
-                    "type": "jurisdiction_issue",
-                    "severity": "High",
-                    "description": f"Reference to UAE Federal Courts instead of ADGM",
-                    "location": f"Position {match.start()}-{match.end()}",
-                    "suggestion": "Replace with ADGM jurisdiction references",
-                    "adgm_reference": "ADGM Companies Regulations 2020, Article 6"
-                })
+        template = _ISSUE_TEMPLATES["jurisdiction_issue"]
+        for match in self._find_matches("jurisdiction_issues", text_lower, text_lower):
+            issue = template.copy()
+            issue["location"] = f"Position {match.start()}-{match.end()}"
+            issues.append(issue)
         
         return issues
     
-    def check_missing_clauses(self, text: str, document_type: str) -> List[Dict[str, Any]]:
+    def check_missing_clauses(self, text: str, document_type: str,
+                              text_lower: Optional[str] = None) -> List[Dict[str, Any]]:
         """Check for missing essential clauses."""
         issues = []
-        text_lower = text.lower()
+        if text_lower is None:
+            text_lower = text.lower()
         
-        # Check for document-specific requirements
-        if document_type in self.adgm_requirements:
-            required_clauses = self.adgm_requirements[document_type]
-            for clause in required_clauses:
-                if clause.lower() not in text_lower:
-                    issues.append({
-                        "type": "missing_clause",
-                        "severity": "High",
-                        "description": f"Missing required clause: {clause}",
-                        "suggestion": f"Add {clause} section to comply with ADGM requirements",
-                        "adgm_reference": f"ADGM Companies Regulations 2020"
-                    })
+        # Check for document-specific requirements; a substring test per clause is
+        # faster than collecting hits with one alternation scan
+        for clause_lower, issue in self._clause_lookups.get(document_type, ()):
+            if clause_lower not in text_lower:
+                issues.append(issue.copy())
         
         return issues
     
-    def check_ambiguous_language(self, text: str) -> List[Dict[str, Any]]:
+    def check_ambiguous_language(self, text: str, text_lower: Optional[str] = None) -> List[Dict[str, Any]]:
         """Check for ambiguous or non-binding language."""
         issues = []
-        text_lower = text.lower()
+        if text_lower is None:
+            text_lower = text.lower()
         
-        for pattern in self.red_flags["ambiguous_language"]:
-            matches = re.finditer(pattern, text_lower, re.IGNORECASE)
-            for match in matches:
-                issues.append({
-                    "type": "ambiguous_language",
-                    "severity": "Medium",
-                    "description": f"Ambiguous language found: '{match.group()}'",
-                    "location": f"Position {match.start()}-{match.end()}",
-                    "suggestion": "Replace with specific, binding language",
-                    "adgm_reference": "ADGM Companies Regulations 2020"
-                })
+        template = _ISSUE_TEMPLATES["ambiguous_language"]
+        for match in self._find_matches("ambiguous_language", text_lower, text_lower):
+            issue = template.copy()
+            issue["description"] = f"Ambiguous language found: '{match.group()}'"
+            issue["location"] = f"Position {match.start()}-{match.end()}"
+            issues.append(issue)
         
         return issues
     
-    def check_missing_signatures(self, text: str) -> List[Dict[str, Any]]:
+    def check_missing_signatures(self, text: str, text_lower: Optional[str] = None) -> List[Dict[str, Any]]:
         """Check for missing signature sections."""
         issues = []
-        text_lower = text.lower()
+        if text_lower is None:
+            text_lower = text.lower()
         
-        signature_found = False
-        for pattern in self.red_flags["missing_signatures"]:
-            if re.search(pattern, text_lower, re.IGNORECASE):
-                signature_found = True
-                break
+        # Stop at the first match of any signature pattern
+        signature_match = next(self._find_matches("missing_signatures", text_lower, text_lower), None)
         
-        if not signature_found:
+        if signature_match is None:
             issues.append({
                 "type": "missing_signatures",
                 "severity": "High",
                 "description": "Missing signature section",
                 "suggestion": "Add proper signature blocks with witness signatures",
-                "adgm_reference": "ADGM Companies Regulations 2020"
+                "adgm_reference": _ADGM_REF
             })
         
         return issues
     
-    def check_incomplete_info(self, text: str) -> List[Dict[str, Any]]:
+    def check_incomplete_info(self, text: str, text_lower: Optional[str] = None) -> List[Dict[str, Any]]:
         """Check for incomplete or placeholder information."""
         issues = []
+        if text_lower is None:
+            text_lower = text.lower()
         
-        for pattern in self.red_flags["incomplete_info"]:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
-                issues.append({
-                    "type": "incomplete_info",
-                    "severity": "Medium",
-                    "description": f"Incomplete information: '{match.group()}'",
-                    "location": f"Position {match.start()}-{match.end()}",
-                    "suggestion": "Complete all required information before submission",
-                    "adgm_reference": "ADGM Companies Regulations 2020"
-                })
+        template = _ISSUE_TEMPLATES["incomplete_info"]
+        for match in self._find_matches("incomplete_info", text, text_lower):
+            issue = template.copy()
+            issue["description"] = f"Incomplete information: '{text[match.start():match.end()]}'"
+            issue["location"] = f"Position {match.start()}-{match.end()}"
+            issues.append(issue)
         
         return issues
     
-    def check_non_compliant_structures(self, text: str) -> List[Dict[str, Any]]:
+    def check_non_compliant_structures(self, text: str, text_lower: Optional[str] = None) -> List[Dict[str, Any]]:
         """Check for non-compliant corporate structures."""
         issues = []
-        text_lower = text.lower()
+        if text_lower is None:
+            text_lower = text.lower()
         
-        for pattern in self.red_flags["non_compliant_structures"]:
-            matches = re.finditer(pattern, text_lower, re.IGNORECASE)
-            for match in matches:
-                issues.append({
-                    "type": "non_compliant_structure",
-                    "severity": "High",
-                    "description": f"Non-compliant structure: '{match.group()}'",
-                    "location": f"Position {match.start()}-{match.end()}",
-                    "suggestion": "Review structure for ADGM compliance",
-                    "adgm_reference": "ADGM Companies Regulations 2020"
-                })
+        template = _ISSUE_TEMPLATES["non_compliant_structure"]
+        for match in self._find_matches("non_compliant_structures", text_lower, text_lower):
+            issue = template.copy()
+            issue["description"] = f"Non-compliant structure: '{match.group()}'"
+            issue["location"] = f"Position {match.start()}-{match.end()}"
+            issues.append(issue)
         
         return issues
     
@@ -213,80 +394,119 @@ class RedFlagChecker:
         """Check for formatting and structural issues."""
         issues = []
         
-        # Check for proper paragraph structure
-        paragraphs = text.split('\n\n')
-        if len(paragraphs) < 3:
+        # Check for proper paragraph structure; counting the breaks avoids
+        # splitting the text into paragraph copies
+        paragraph_count = text.count('\n\n') + 1
+        if paragraph_count < 3:
             issues.append({
                 "type": "formatting_issue",
                 "severity": "Low",
                 "description": "Document appears to have insufficient structure",
                 "suggestion": "Organize document into clear sections with proper headings",
-                "adgm_reference": "ADGM Document Standards"
+                "adgm_reference": _ADGM_DOCUMENT_STANDARDS
             })
         
         # Check for proper numbering
-        if not re.search(r'\d+\.', text):
+        if not _NUMBERING_RE.search(text):
             issues.append({
                 "type": "formatting_issue",
                 "severity": "Low",
                 "description": "Document lacks proper clause numbering",
                 "suggestion": "Add numbered clauses for better organization",
-                "adgm_reference": "ADGM Document Standards"
+                "adgm_reference": _ADGM_DOCUMENT_STANDARDS
             })
         
         return issues
     
-    def analyze_document(self, text: str, document_type: str) -> Dict[str, Any]:
-        """Comprehensive document analysis for red flags."""
+    def analyze_document(self, text: str, document_type: str,
+                         categories: Optional[Set[str]] = None) -> Dict[str, Any]:
+        """Comprehensive document analysis for red flags.
+        
+        categories limits the checks run to the given summary keys, e.g.
+        {"jurisdiction_issues"}; by default every check runs. Results are cached as
+        serialized payloads, so every call gets its own copy to mutate.
+        """
+        if categories is not None:
+            categories = frozenset(categories)
+        key = (hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest(), document_type, categories)
+        with self._analysis_cache_lock:
+            payload = self._analysis_cache.get(key)
+            if payload is not None:
+                self._analysis_cache.move_to_end(key)
+        if payload is not None:
+            return orjson.loads(payload)
+        
+        analysis = self._analyze_document(text, document_type, categories)
+        payload = orjson.dumps(analysis)
+        with self._analysis_cache_lock:
+            self._analysis_cache[key] = payload
+            self._analysis_cache.move_to_end(key)
+            if len(self._analysis_cache) > self._analysis_cache_size:
+                self._analysis_cache.popitem(last=False)
+        return analysis
+    
+    def clear_cache(self):
+        """Forget cached analyses, so the next call re-runs the checks."""
+        with self._analysis_cache_lock:
+            self._analysis_cache.clear()
+    
+    def analyze_documents(self, documents: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """Analyze several (text, document type) pairs across worker processes, in the order given."""
+        if len(documents) <= 1:
+            return [self.analyze_document(text, document_type) for text, document_type in documents]
+        
+        with ProcessPoolExecutor(max_workers=min(len(documents), os.cpu_count() or 1)) as executor:
+            return list(executor.map(_analyze_in_worker, documents, chunksize=4))
+    
+    def _analyze_document(self, text: str, document_type: str,
+                          categories: Optional[FrozenSet[str]] = None) -> Dict[str, Any]:
+        """Run the selected checks and summarize the issues found."""
         all_issues = []
         
-        # Run all checks
-        all_issues.extend(self.check_jurisdiction_issues(text))
-        all_issues.extend(self.check_missing_clauses(text, document_type))
-        all_issues.extend(self.check_ambiguous_language(text))
-        all_issues.extend(self.check_missing_signatures(text))
-        all_issues.extend(self.check_incomplete_info(text))
-        all_issues.extend(self.check_non_compliant_structures(text))
-        all_issues.extend(self.check_formatting_issues(text))
-        
-        # Calculate overall severity
-        severity_scores = {"Low": 1, "Medium": 2, "High": 3}
-        max_severity = max([severity_scores.get(issue["severity"], 1) for issue in all_issues]) if all_issues else 0
-        
-        overall_severity = "Low"
-        if max_severity >= 3:
-            overall_severity = "High"
-        elif max_severity >= 2:
-            overall_severity = "Medium"
-        
-        # Group issues by type
+        # Lower-case once and share it across the checks
+        text_lower = text.lower()
+        
+        # Run the checks, all of them unless a subset was asked for
+        run_all = categories is None
+        if run_all or "jurisdiction_issues" in categories:
+            all_issues.extend(self.check_jurisdiction_issues(text, text_lower))
+        if run_all or "missing_clauses" in categories:
+            all_issues.extend(self.check_missing_clauses(text, document_type, text_lower))
+        if run_all or "ambiguous_language" in categories:
+            all_issues.extend(self.check_ambiguous_language(text, text_lower))
+        if run_all or "missing_signatures" in categories:
+            all_issues.extend(self.check_missing_signatures(text, text_lower))
+        if run_all or "incomplete_info" in categories:
+            all_issues.extend(self.check_incomplete_info(text, text_lower))
+        if run_all or "non_compliant_structures" in categories:
+            all_issues.extend(self.check_non_compliant_structures(text, text_lower))
+        if run_all or "formatting_issues" in categories:
+            all_issues.extend(self.check_formatting_issues(text))
+        
+        # Group issues by type and find the highest severity in one pass
+        max_severity = 0
         issues_by_type = {}
         for issue in all_issues:
-            issue_type = issue["type"]
-            if issue_type not in issues_by_type:
-                issues_by_type[issue_type] = []
-            issues_by_type[issue_type].append(issue)
+            issues_by_type.setdefault(issue["type"], []).append(issue)
+            score = _SEVERITY_SCORES.get(issue["severity"], 1)
+            if score > max_severity:
+                max_severity = score
         
         return {
             "document_type": document_type,
             "total_issues": len(all_issues),
-            "overall_severity": overall_severity,
+            "overall_severity": _SEVERITY_LEVELS[max_severity],
             "issues": all_issues,
             "issues_by_type": issues_by_type,
             "summary": {
-                "jurisdiction_issues": len([i for i in all_issues if i["type"] == "jurisdiction_issue"]),
-                "missing_clauses": len([i for i in all_issues if i["type"] == "missing_clause"]),
-                "ambiguous_language": len([i for i in all_issues if i["type"] == "ambiguous_language"]),
-                "missing_signatures": len([i for i in all_issues if i["type"] == "missing_signatures"]),
-                "incomplete_info": len([i for i in all_issues if i["type"] == "incomplete_info"]),
-                "non_compliant_structures": len([i for i in all_issues if i["type"] == "non_compliant_structure"]),
-                "formatting_issues": len([i for i in all_issues if i["type"] == "formatting_issue"])
+                summary_key: len(issues_by_type.get(issue_type, ()))
+                for summary_key, issue_type in _SUMMARY_KEYS
             }
         }
     
     def generate_compliance_report(self, analysis: Dict[str, Any]) -> str:
         """Generate a human-readable compliance report."""
-        report = f"""
+        parts = [f"""
 # ADGM Compliance Analysis Report
 
 **Document Type:** {analysis['document_type']}
@@ -294,21 +514,34 @@ class RedFlagChecker:
 **Total Issues Found:** {analysis['total_issues']}
 
 ## Summary
-"""
+"""]
         
         for issue_type, count in analysis['summary'].items():
             if count > 0:
-                report += f"- {issue_type.replace('_', ' ').title()}: {count}\n"
+                parts.append(f"- {issue_type.replace('_', ' ').title()}: {count}\n")
         
-        report += "\n## Detailed Issues\n"
+        parts.append("\n## Detailed Issues\n")
         
         for issue in analysis['issues']:
-            report += f"""
+            parts.append(f"""
 ### {issue['type'].replace('_', ' ').title()}
 - **Severity:** {issue['severity']}
 - **Description:** {issue['description']}
 - **Suggestion:** {issue['suggestion']}
 - **ADGM Reference:** {issue.get('adgm_reference', 'N/A')}
-"""
+""")
         
-        return report
+        return "".join(parts)
+
+
+_worker_checker: Optional[RedFlagChecker] = None
+
+
+def _analyze_in_worker(document: Tuple[str, str]) -> Dict[str, Any]:
+    """Process pool entry point for analyze_documents; builds one checker per worker."""
+    global _worker_checker
+    if _worker_checker is None:
+        _worker_checker = RedFlagChecker()
+    
+    text, document_type = document
+    return _worker_checker.analyze_document(text, document_type)